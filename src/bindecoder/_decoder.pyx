@@ -0,0 +1,238 @@
+# cython: language_level=3
+#=======================================================================
+"""
+Compiled implementation of the Decoder base class
+"""
+#	Optional drop-in replacement for decoder.Decoder with the scalar
+#	reads compiled to direct byte accesses.  Keep the behaviour in
+#	sync with decoder.py, which remains the pure-Python fallback.
+#
+#	Build in place with:
+#	    cythonize -i src/bindecoder/_decoder.pyx
+#=======================================================================
+from contextlib import contextmanager
+import binascii
+import struct
+
+# Map each byte to its printable character, or '.'
+_printable = bytes(b if 32 <= b < 127 else 0x2e for b in range(256))
+
+# Pre-built Struct objects for the float types, per byte order
+_float_structs = {'big': (struct.Struct('>f'), struct.Struct('>d')),
+                  'little': (struct.Struct('<f'), struct.Struct('<d'))}
+
+cdef class Decoder:
+    """Base class for decoding binary data
+
+    The input may be a binary file-like object, which is slurped,
+    or anything supporting the buffer protocol (bytes, mmap etc.).
+    Reads return zero-copy memoryview slices of a single buffer.
+    """
+    cdef object _buf
+    cdef const unsigned char[:] _data
+    cdef public object view
+    cdef public object end
+    cdef public object byteorder
+    cdef object _f4, _f8
+    cdef bint _big
+    cdef Py_ssize_t _pos, _base, _limit
+    cdef list _stack
+
+    def __init__(self, stream, view, big_endian=False):
+        try:
+            self._buf = memoryview(stream)
+        except TypeError:
+            self._buf = memoryview(stream.read())
+        self._data = self._buf
+        self.view = view
+        self._pos = 0
+        self._base = 0
+        self._limit = len(self._buf)
+        self._stack = []
+        self._set_endian(big_endian)
+
+    @property
+    def pos(self):
+        """Position relative to the start of the current (sub)stream"""
+        return self._pos - self._base
+
+    def _set_endian(self, big):
+        self._big = big
+        self.end = '>' if big else '<'
+        self.byteorder = 'big' if big else 'little'
+        self._f4, self._f8 = _float_structs[self.byteorder]
+
+    cdef inline Py_ssize_t _need(self, Py_ssize_t size) except -1:
+        if self._pos + size > self._limit:
+            self._raise_eof(size)
+        return 0
+
+    def i1(self, name=None):
+        """Signed 8-bit integer"""
+        self._need(1)
+        cdef signed char value = <signed char>self._data[self._pos]
+        self._pos += 1
+        if name:
+            self.vset(name, value)
+        return value
+
+    def u1(self, name=None):
+        """Unsigned 8-bit integer"""
+        self._need(1)
+        cdef unsigned char value = self._data[self._pos]
+        self._pos += 1
+        if name:
+            self.vset(name, value)
+        return value
+
+    def i2(self, name=None):
+        """Signed 16-bit integer"""
+        return self._int(2, True, name)
+
+    def u2(self, name=None):
+        """Unsigned 16-bit integer"""
+        return self._int(2, False, name)
+
+    def i4(self, name=None):
+        """Signed 32-bit integer"""
+        return self._int(4, True, name)
+
+    def u4(self, name=None):
+        """Unsigned 32-bit integer"""
+        return self._int(4, False, name)
+
+    def i8(self, name=None):
+        """Signed 64-bit integer"""
+        return self._int(8, True, name)
+
+    def u8(self, name=None):
+        """Unsigned 64-bit integer"""
+        return self._int(8, False, name)
+
+    cdef _int(self, Py_ssize_t size, bint is_signed, name):
+        cdef unsigned long long uval = 0
+        cdef Py_ssize_t i, p
+        # Typed as object so each branch converts from its own C type;
+        # inference would otherwise unify value to unsigned long long
+        # and wrap the signed results
+        cdef object value
+        self._need(size)
+        p = self._pos
+        if self._big:
+            for i in range(size):
+                uval = (uval << 8) | self._data[p + i]
+        else:
+            for i in range(size):
+                uval |= (<unsigned long long>self._data[p + i]) << (8 * i)
+        self._pos = p + size
+        if is_signed and uval >> (8 * size - 1):
+            if size == 8:
+                value = <long long>uval
+            else:
+                # The subtraction must not be done with a C int shift:
+                # 1 << 32 overflows the operand width
+                value = <long long>uval - ((<long long>1) << (8 * size))
+        else:
+            value = uval
+        if name:
+            self.vset(name, value)
+        return value
+
+    def f4(self, name=None):
+        """Unsigned 32-bit floating-point"""
+        value, = self._f4.unpack(self.read(4))
+        if name:
+            self.vset(name, value)
+        return value
+
+    def f8(self, name=None):
+        """Unsigned 64-bit floating-point"""
+        value, = self._f8.unpack(self.read(8))
+        if name:
+            self.vset(name, value)
+        return value
+
+    def read(self, size=None):
+        """Read a number of bytes, as a memoryview"""
+        cdef Py_ssize_t n
+        if size is None:
+            data = self._buf[self._pos:self._limit]
+            self._pos = self._limit
+        else:
+            n = size
+            self._need(n)
+            data = self._buf[self._pos:self._pos + n]
+            self._pos += n
+        return data
+
+    def read_until(self, sep=b'\0'):
+        """Read up to a separator byte, consuming but not returning it"""
+        obj = self._buf.obj
+        if hasattr(obj, 'find') and len(obj) == len(self._buf):
+            i = obj.find(sep, self._pos, self._limit)
+        else:
+            # The buffer is a window on some other object whose offsets
+            # do not line up with ours; search a bounded copy instead
+            i = bytes(self._buf[self._pos:self._limit]).find(sep)
+            if i >= 0:
+                i += self._pos
+        if i < 0:
+            raise EOFError('Separator %r not found' % (sep,))
+        data = self._buf[self._pos:i]
+        self._pos = i + 1
+        return data
+
+    def _require(self, size):
+        self._need(size)
+
+    cdef _raise_eof(self, Py_ssize_t size):
+        raise EOFError('Tried to read %d byte%s, only %d available' %
+                       (size, '' if size==1 else 's',
+                        self._limit - self._pos))
+
+    def seek(self, position):
+        """Move to a specific position in the (sub)stream"""
+        self._pos = self._base + position
+
+    @contextmanager
+    def substream(self, size):
+        """Use the following size bytes as a self-contained stream"""
+        self._need(size)
+        self._stack.append((self._base, self._limit))
+        self._base = self._pos
+        self._limit = self._pos + size
+        try:
+            yield
+        finally:
+            self._pos = self._limit
+            self._base, self._limit = self._stack.pop()
+
+    @contextmanager
+    def endian(self, big):
+        """Temporarily use a given endianness"""
+        saved = self.end, self.byteorder, self._f4, self._f8, self._big
+        self._set_endian(big)
+        try:
+            yield
+        finally:
+            self.end, self.byteorder, self._f4, self._f8, self._big = saved
+
+    def hexdump(self, data, limit=256):
+        """Emit up to limit bytes as hex+ASCII lines via the viewer"""
+        # data is normally a memoryview; only the bounded head is copied
+        head = bytes(data[:limit])
+        for pos in range(0, len(head), 16):
+            hunk = head[pos:pos+16]
+            hx = binascii.hexlify(hunk).decode('ascii')
+            pairs = [hx[i:i+2] for i in range(0, len(hx), 2)]
+            pairs += ['  '] * (16 - len(pairs))
+            sbytes = ''.join(' %s %s %s %s ' % tuple(pairs[g:g+4])
+                             for g in range(0, 16, 4))
+            ascii = hunk.translate(_printable).decode('ascii')
+            self.vset('%04x' % pos, '%s %s' % (sbytes, ascii))
+        if len(data) > limit:
+            self.vset('dump_size', len(data))
+
+    def vset(self, name, value):
+        self.view.set(name, value)
+        return value
@@ -0,0 +1,22 @@
+#=======================================================================
+"""
+Numba-compiled kernels for hot sample-table loops
+"""
+#	Importing this module requires numpy and numba; callers guard the
+#	import and fall back to the plain implementations when it fails.
+#=======================================================================
+import numpy as np
+from numba import njit
+
+@njit(cache=True)
+def decode_be_u32(buf):
+    """Decode a uint8 buffer of big-endian u32 values to a native array"""
+    n = buf.shape[0] // 4
+    out = np.empty(n, np.uint32)
+    for i in range(n):
+        base = i * 4
+        out[i] = ((np.uint32(buf[base]) << 24)
+                  | (np.uint32(buf[base+1]) << 16)
+                  | (np.uint32(buf[base+2]) << 8)
+                  | np.uint32(buf[base+3]))
+    return out
@@ -7,7 +7,6 @@ Decode AVI file
 #       http://msdn2.microsoft.com/en-us/library/ms779636(VS.85).aspx
 #=======================================================================
 from .decoder import Decoder
-from .hexdumper import HexDumper
 
 class AVIDecoder(Decoder):
     def __init__(self, file, view):
@@ -46,10 +45,10 @@ class AVIDecoder(Decoder):
                         method()
                     rest = self.read()
                     if rest:
-                        self.view.blob('_rest', rest)
+                        self.view.blob('_rest', bytes(rest))
         padsize = 1 - (size + 1) % 2
         if padsize:
-            self.view.blob('_pad', self.read(padsize))
+            self.view.blob('_pad', bytes(self.read(padsize)))
         return True
 
     # Chunk types
@@ -131,8 +130,8 @@ class AVIDecoder(Decoder):
     def do_strd(self):
         type = self.s4()
         self.vset('type', type)
-        from jpgdecode import decode_ifd
-        self.view.blob('_unknown', self.read(4))
+        from .jpg import decode_ifd
+        self.view.blob('_unknown', bytes(self.read(4)))
         decode_ifd(self, self.pos, self.pos)
         #0a01
         #0100
@@ -193,7 +192,7 @@ class AVIDecoder(Decoder):
         #9003
 
     def do_strn(self):
-        name = self.read()
+        name = bytes(self.read())
         if name.endswith(b'\0'):
             name = name[:-1]
         self.vset('name', name.decode('iso-8859-1'))
@@ -218,7 +217,7 @@ class AVIDecoder(Decoder):
                 self.vset('_size', size)
                 self.hexdump(self.read(size))
                 if size % 4:
-                    self.vset('_pad', self.read(4 - size % 4))
+                    self.vset('_pad', bytes(self.read(4 - size % 4)))
             i += 1
 
     def do_idx1(self):
@@ -263,27 +262,24 @@ class AVIDecoder(Decoder):
                     self.u4('VideoXOffsetInT')
                     self.u4('VideoYValidStartLine')
 
-    # Output methods
-    def hexdump(self, data, limit=256):
-        for line in HexDumper(data[:limit]).iter_lines():
-            offset, _, dump = line.partition(': ')
-            self.vset(offset[1:].replace(' ','0'), dump)
-        if len(data) > limit:
-            self.vset('dump_size', len(data))
-
     # AVI-specific low-level items
     def s4(self):
         """Read a 4-byte string (fourcc)"""
-        b4 = self.read(4)
+        b4 = bytes(self.read(4))
         return b4.decode('iso-8859-1')
 
 def main():
     from .viewer import PlainViewer
+    import mmap
     import sys
     view = PlainViewer()
     with open(sys.argv[1],'rb') as f:
-        dec = AVIDecoder(f, view)
-        dec.run()
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        dec = AVIDecoder(mm, view)
+        try:
+            dec.run()
+        finally:
+            view.flush()
 
 if __name__=='__main__':
     main()
@@ -4,103 +4,199 @@ Decode binary files
 """
 #=======================================================================
 from contextlib import contextmanager
-from io import BytesIO
+import binascii
 import struct
 
+# Map each byte to its printable character, or '.'
+_printable = bytes(b if 32 <= b < 127 else 0x2e for b in range(256))
+
+# Pre-built Struct objects for the float types, per byte order
+_float_structs = {'big': (struct.Struct('>f'), struct.Struct('>d')),
+                  'little': (struct.Struct('<f'), struct.Struct('<d'))}
+
 class Decoder:
-    """Base class for decoding binary data"""
+    """Base class for decoding binary data
+
+    The input may be a binary file-like object, which is slurped,
+    or anything supporting the buffer protocol (bytes, mmap etc.).
+    Reads return zero-copy memoryview slices of a single buffer.
+    """
     def __init__(self, stream, view, big_endian=False):
-        self.stream = stream
+        try:
+            self._buf = memoryview(stream)
+        except TypeError:
+            self._buf = memoryview(stream.read())
         self.view = view
-        self.pos = 0
-        self.end = '>' if big_endian else '<'
-        self.stream_stack = []
+        self._pos = 0
+        self._base = 0
+        self._limit = len(self._buf)
+        self._stack = []
+        self._set_endian(big_endian)
+
+    @property
+    def pos(self):
+        """Position relative to the start of the current (sub)stream"""
+        return self._pos - self._base
+
+    def _set_endian(self, big):
+        self.end = '>' if big else '<'
+        self.byteorder = 'big' if big else 'little'
+        self._f4, self._f8 = _float_structs[self.byteorder]
 
     def i1(self, name=None):
         """Signed 8-bit integer"""
-        return self.scalar(name, 1, 'b')
+        value = int.from_bytes(self.read(1), self.byteorder, signed=True)
+        if name:
+            self.vset(name, value)
+        return value
 
     def u1(self, name=None):
         """Unsigned 8-bit integer"""
-        return self.scalar(name, 1, 'B')
+        value = int.from_bytes(self.read(1), self.byteorder)
+        if name:
+            self.vset(name, value)
+        return value
 
     def i2(self, name=None):
         """Signed 16-bit integer"""
-        return self.scalar(name, 2, 'h')
+        value = int.from_bytes(self.read(2), self.byteorder, signed=True)
+        if name:
+            self.vset(name, value)
+        return value
 
     def u2(self, name=None):
         """Unsigned 16-bit integer"""
-        return self.scalar(name, 2, 'H')
+        value = int.from_bytes(self.read(2), self.byteorder)
+        if name:
+            self.vset(name, value)
+        return value
 
     def i4(self, name=None):
         """Signed 32-bit integer"""
-        return self.scalar(name, 4, 'i')
+        value = int.from_bytes(self.read(4), self.byteorder, signed=True)
+        if name:
+            self.vset(name, value)
+        return value
 
     def u4(self, name=None):
         """Unsigned 32-bit integer"""
-        return self.scalar(name, 4, 'I')
+        value = int.from_bytes(self.read(4), self.byteorder)
+        if name:
+            self.vset(name, value)
+        return value
 
     def i8(self, name=None):
         """Signed 64-bit integer"""
-        return self.scalar(name, 8, 'q')
+        value = int.from_bytes(self.read(8), self.byteorder, signed=True)
+        if name:
+            self.vset(name, value)
+        return value
 
     def u8(self, name=None):
         """Unsigned 64-bit integer"""
-        return self.scalar(name, 8, 'Q')
+        value = int.from_bytes(self.read(8), self.byteorder)
+        if name:
+            self.vset(name, value)
+        return value
 
     def f4(self, name=None):
         """Unsigned 32-bit floating-point"""
-        return self.scalar(name, 4, 'f')
+        value, = self._f4.unpack(self.read(4))
+        if name:
+            self.vset(name, value)
+        return value
 
     def f8(self, name=None):
         """Unsigned 64-bit floating-point"""
-        return self.scalar(name, 8, 'd')
-
-    def scalar(self, name, size, desc):
-        value, = struct.unpack(self.end + desc, self.read(size))
+        value, = self._f8.unpack(self.read(8))
         if name:
             self.vset(name, value)
         return value
 
     def read(self, size=None):
-        """Read a number of bytes"""
+        """Read a number of bytes, as a memoryview"""
         if size is None:
-            data = self.stream.read()
+            data = self._buf[self._pos:self._limit]
+            self._pos = self._limit
         else:
-            data = self.stream.read(size)
-            if len(data) < size:
-                raise EOFError('Tried to read %d byte%s, only %d available' %
-                               (size, '' if size==1 else 's', len(data)))
-        self.pos += len(data)
+            self._require(size)
+            data = self._buf[self._pos:self._pos + size]
+            self._pos += size
         return data
 
+    def read_until(self, sep=b'\0'):
+        """Read up to a separator byte, consuming but not returning it"""
+        obj = self._buf.obj
+        if hasattr(obj, 'find') and len(obj) == len(self._buf):
+            i = obj.find(sep, self._pos, self._limit)
+        else:
+            # The buffer is a window on some other object whose offsets
+            # do not line up with ours; search a bounded copy instead
+            i = bytes(self._buf[self._pos:self._limit]).find(sep)
+            if i >= 0:
+                i += self._pos
+        if i < 0:
+            raise EOFError('Separator %r not found' % (sep,))
+        data = self._buf[self._pos:i]
+        self._pos = i + 1
+        return data
+
+    def _require(self, size):
+        if self._pos + size > self._limit:
+            raise EOFError('Tried to read %d byte%s, only %d available' %
+                           (size, '' if size==1 else 's',
+                            self._limit - self._pos))
+
     def seek(self, position):
-        """Move to a specific position in the file"""
-        self.stream.seek(position)
-        self.pos = position
+        """Move to a specific position in the (sub)stream"""
+        self._pos = self._base + position
 
     @contextmanager
     def substream(self, size):
         """Use the following size bytes as a self-contained stream"""
-        data = self.read(size)
-        sub = BytesIO(data)
-        self.stream_stack.append((self.stream, self.pos))
-        self.stream, self.pos = sub, 0
+        self._require(size)
+        self._stack.append((self._base, self._limit))
+        self._base = self._pos
+        self._limit = self._pos + size
         try:
             yield
         finally:
-            self.stream, self.pos = self.stream_stack.pop()
+            self._pos = self._limit
+            self._base, self._limit = self._stack.pop()
 
     @contextmanager
     def endian(self, big):
         """Temporarily use a given endianness"""
-        old_end, self.end = self.end, '>' if big else '<'
+        saved = self.end, self.byteorder, self._f4, self._f8
+        self._set_endian(big)
         try:
             yield
         finally:
-            self.end = old_end
+            self.end, self.byteorder, self._f4, self._f8 = saved
+
+    def hexdump(self, data, limit=256):
+        """Emit up to limit bytes as hex+ASCII lines via the viewer"""
+        # data is normally a memoryview; only the bounded head is copied
+        head = bytes(data[:limit])
+        for pos in range(0, len(head), 16):
+            hunk = head[pos:pos+16]
+            hx = binascii.hexlify(hunk).decode('ascii')
+            pairs = [hx[i:i+2] for i in range(0, len(hx), 2)]
+            pairs += ['  '] * (16 - len(pairs))
+            sbytes = ''.join(' %s %s %s %s ' % tuple(pairs[g:g+4])
+                             for g in range(0, 16, 4))
+            ascii = hunk.translate(_printable).decode('ascii')
+            self.vset('%04x' % pos, '%s %s' % (sbytes, ascii))
+        if len(data) > limit:
+            self.vset('dump_size', len(data))
 
     def vset(self, name, value):
         self.view.set(name, value)
         return value
 
+try:
+    # Compiled implementation, if built (see _decoder.pyx)
+    from ._decoder import Decoder
+except ImportError:
+    pass
+
@@ -7,11 +7,12 @@ Decode FLV file
 #       https://www.adobe.com/content/dam/acom/en/devnet/flv/video_file_format_spec_v10.pdf
 #=======================================================================
 from .decoder import Decoder
-from .hexdumper import HexDumper
 
 class FLVDecoder(Decoder):
-    def __init__(self, file, view):
+    def __init__(self, file, view, index_only=False):
         super(FLVDecoder,self).__init__(file, view, big_endian=True)
+        # Only emit tag headers, seeking over the payloads
+        self.index_only = index_only
 
     def run(self):
         # FLV header
@@ -26,15 +27,24 @@ class FLVDecoder(Decoder):
         doff = self.u4()
         self.vset('DataOffset', doff)
         self.read(doff - self.pos)
-        with self.view.array('Tag'):
+        # Enter/exit the viewer directly: a contextmanager pair per tag
+        # is measurable overhead in tag-dense files
+        view = self.view
+        view.enter_array('Tag')
+        try:
             i = 0
             while True:
-                with self.view.map(i):
+                view.enter_map(i)
+                try:
                     # Sequence of back-pointers
                     self.vset('PreviousTagSize', self.u4())
                     self.tag()
                     #break
+                finally:
+                    view.exit()
                 i += 1
+        finally:
+            view.exit()
 
     def tag(self):
         tagtype = self.u1()
@@ -51,6 +61,11 @@ class FLVDecoder(Decoder):
         self.vset('Timestamp', self.ui24())
         self.vset('TimestampExtended', self.u1())
         self.vset('StreamID', self.ui24())
+        if self.index_only:
+            # Seek past the payload; free on a mmap'd input
+            self._require(dsize)
+            self.seek(self.pos + dsize)
+            return
         with self.substream(dsize):
             if tagtype == 18:
                 self.script_data()
@@ -58,26 +73,34 @@ class FLVDecoder(Decoder):
                 self.video_data()
             self.hexdump(self.read())
 
-    frametype_map = {1:'keyframe',
-                     2:'inter frame',
-                     3:'disposable inter frame',
-                     4:'generated keyframe',
-                     5:'video info/command frame'}
-    codecid_map = {1:'JPEG',
-                   2:'Sorenson H.263',
-                   3:'Screen video',
-                   4:'On2 VP6',
-                   5:'On2 VP6 with alpha channel',
-                   6:'Screen video version 2',
-                   7:'AVC'}
+    # Dense small keys: tuple indexing beats a dict lookup per frame
+    _frametypes = (None,
+                   'keyframe',
+                   'inter frame',
+                   'disposable inter frame',
+                   'generated keyframe',
+                   'video info/command frame')
+    _codecids = (None,
+                 'JPEG',
+                 'Sorenson H.263',
+                 'Screen video',
+                 'On2 VP6',
+                 'On2 VP6 with alpha channel',
+                 'Screen video version 2',
+                 'AVC')
 
     def video_data(self):
-        with self.view.map('VideoData'):
+        self.view.enter_map('VideoData')
+        try:
             tid = self.u1()
             ftype = tid >> 4
             codecid = tid & 0xf
-            self.vset('FrameType', self.frametype_map.get(ftype,ftype))
-            self.vset('CodecID', self.codecid_map.get(codecid,codecid))
+            self.vset('FrameType',
+                      self._frametypes[ftype] if 0 < ftype < 6 else ftype)
+            self.vset('CodecID',
+                      self._codecids[codecid] if 0 < codecid < 8 else codecid)
+        finally:
+            self.view.exit()
             
     def script_data(self):
         with self.view.array('ScriptData'):
@@ -91,7 +114,7 @@ class FLVDecoder(Decoder):
                 if nt != 2:
                     raise ValueError('Expected 2 SCRIPTDATANAME')
                 nlen = self.u2()
-                name = self.read(nlen).decode('ascii')
+                name = bytes(self.read(nlen)).decode('ascii')
                 with self.view.map(i):
                     if nt not in (2, 12):
                         raise ValueError('Unexpected type %d for name' % nt)
@@ -102,7 +125,7 @@ class FLVDecoder(Decoder):
                         with self.view.map('Value'):
                             for i in range(alen):
                                 klen = self.u2()
-                                key = self.read(klen).decode('ascii')
+                                key = bytes(self.read(klen)).decode('ascii')
                                 xt, xvalue = self.obj()
                                 self.vset(key, xvalue)
                     else:
@@ -121,20 +144,13 @@ class FLVDecoder(Decoder):
             value = self.u1()
         elif otype == 2:        # String
             nlen = self.u2()
-            value = self.read(nlen).decode('ascii')
+            value = bytes(self.read(nlen)).decode('ascii')
         elif otype == 8:        # ECMA array
             value = self.u4()   # Length
         else:
             raise NotImplementedError('Value type %d' % otype)
         return otype, value
 
-    # Output methods
-    def hexdump(self, data, limit=256):
-        for line in HexDumper(data[:limit]).iter_lines():
-            offset, _, dump = line.partition(': ')
-            self.vset(offset[1:].replace(' ','0'), dump)
-        if len(data) > limit:
-            self.vset('dump_size', len(data))
                       
     # FLV-specific low-level items
     def ui24(self):
@@ -144,16 +160,26 @@ class FLVDecoder(Decoder):
 
     def s4(self):
         """Read a 4-byte string (fourcc)"""
-        b4 = self.read(4)
+        b4 = bytes(self.read(4))
         return b4.decode('iso-8859-1')
 
 def main():
     from .viewer import PlainViewer
-    import sys
+    import argparse
+    import mmap
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--index-only', action='store_true',
+                    help='Show tag headers only, skipping payloads')
+    ap.add_argument('flvfile')
+    args = ap.parse_args()
     view = PlainViewer()
-    with open(sys.argv[1],'rb') as f:
-        dec = FLVDecoder(f, view)
-        dec.run()
+    with open(args.flvfile,'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        dec = FLVDecoder(mm, view, index_only=args.index_only)
+        try:
+            dec.run()
+        finally:
+            view.flush()
 
 if __name__=='__main__':
     main()
@@ -11,7 +11,6 @@ Decode JPEG (JFIF) file
 #	https://www.adobe.com/devnet-apps/photoshop/fileformatashtml/
 #=======================================================================
 from .decoder import Decoder
-from .hexdumper import HexDumper
 
 marker_name = {
     0xC0:'SOF0',
@@ -49,6 +48,10 @@ marker_name = {
     0xFE:'COM',
     }
 
+# Fill in fallback names so the lookup is a single dict hit per marker
+for _m in range(256):
+    marker_name.setdefault(_m, '%#02X' % _m)
+
 class JpgDecoder(Decoder):
     def __init__(self, file, view, with_ecd=False):
         super(JpgDecoder,self).__init__(file, view, big_endian=True)
@@ -63,7 +66,7 @@ class JpgDecoder(Decoder):
         if ff != 0xff:
             raise ValueError('Expected FF byte, found %#02x' % ff)
         marker = self.u1()
-        name = marker_name.get(marker) or '%#02X' % marker
+        name = marker_name[marker]
         lo = marker & 0xf
         if 0xD0 <= marker <= 0xD9:
             # No content
@@ -71,7 +74,7 @@ class JpgDecoder(Decoder):
         else:
             size = self.u2()
             with self.view.map(name):
-                self.vset('_size', '%#x' % size)
+                self.vset('_size', size)
                 if name == 'APP0':
                     with self.substream(size - 2):
                         ident = self.sz()
@@ -103,13 +106,13 @@ class JpgDecoder(Decoder):
                         if atype == b'Exif':
                             zz = self.read(2)
                             with self.substream(size - 8):
-                                tiff = TIFFDecoder(self.stream, self.view)
+                                tiff = TIFFDecoder(self.read(), self.view)
                                 tiff.run()
                         else:
                             self.hexdump(self.read())
                 elif name == 'APP13':
                     with self.substream(size - 2):
-                        app = self.read(14)
+                        app = bytes(self.read(14))
                         self.vset('app', app)
                         if app == b'Photoshop 3.0\0':
                             self.app13_photoshop()
@@ -153,8 +156,6 @@ class JpgDecoder(Decoder):
                                 self.vset(i+1, nsym)
                                 n += nsym
                         self.vset('_totsym', n)
-                        for i in range(n):
-                            pass
                         self.hexdump(self.read())
                 elif name == 'SOS':
                     with self.substream(size - 2):
@@ -195,7 +196,7 @@ class JpgDecoder(Decoder):
         """Decode APP13 data"""
         while True:
             try:
-                type = self.read(4)
+                type = bytes(self.read(4))
             except EOFError:
                 break
             self.vset('type', type)
@@ -204,7 +205,7 @@ class JpgDecoder(Decoder):
                 with self.endian(True):
                     itag = self.u2('itag')
                     nlen = self.u1()
-                    tag_name = self.read(nlen)
+                    tag_name = bytes(self.read(nlen))
                     self.vset('tag', tag_name)
                     if nlen % 2 == 0:
                         self.read(1) # Align
@@ -230,18 +231,18 @@ class JpgDecoder(Decoder):
                                                 self.u2('version')
                                             elif tag == 90:
                                                 # CodedCharacterSet
-                                                cset = self.read(len)
+                                                cset = bytes(self.read(len))
                                                 self.vset('charset', cset)
                                             elif tag == 25:
                                                 # Keywords
-                                                kw = self.read(len).rstrip(b'\0')
+                                                kw = bytes(self.read(len)).rstrip(b'\0')
                                                 self.vset('keywords', kw)
                                             else:
                                                 self.hexdump(self.read(len))
                         elif itag == 0x0425:
                             # IPC Digest
                             with self.view.map('ITCDigest'):
-                                digest = self.read()
+                                digest = bytes(self.read())
                                 self.view.blob('digest', digest)
                         self.hexdump(self.read())
         self.hexdump(self.read())
@@ -249,21 +250,7 @@ class JpgDecoder(Decoder):
     # Specific read methods
     def sz(self):
         """Read NUL-terminated string"""
-        tok = b''
-        while True:
-            b = self.read(1)
-            if b == b'\0':
-                break
-            tok += b
-        return tok.decode('ascii')
-
-    # Output methods
-    def hexdump(self, data, limit=256):
-        for line in HexDumper(data[:limit]).iter_lines():
-            offset, _, dump = line.partition(': ')
-            self.vset(offset[1:].replace(' ','0'), dump)
-        if len(data) > limit:
-            self.vset('dump_size', len(data))
+        return bytes(self.read_until(b'\0')).decode('ascii')
 
 # https://www.awaresystems.be/imaging/tiff/tifftags/baseline.html
 # https://exiftool.org/TagNames/EXIF.html
@@ -337,7 +324,7 @@ def decode_ifd(self, ifdpos, base=0):
     nifd = self.u2('_nifd')
     with self.view.map('IFD'):
         for i in range(nifd):
-            self.stream.seek(ifdpos + 2 + 12*i)
+            self.seek(ifdpos + 2 + 12*i)
             tag = self.u2()
             ftype = self.u2()
             count = self.u4()
@@ -348,8 +335,8 @@ def decode_ifd(self, ifdpos, base=0):
                 value = 'BYTE[%d]@%d' % (count, offset)
             elif ftype == 2: # ASCII
                 offset = self.u4()
-                self.stream.seek(base + offset)
-                vbytes = self.read(count)
+                self.seek(base + offset)
+                vbytes = bytes(self.read(count))
                 value = vbytes.decode('ascii').rstrip('\0')
                 #value = 'ASCII[%d]@%d' % (count, offset)
             elif ftype == 3: # SHORT
@@ -363,7 +350,7 @@ def decode_ifd(self, ifdpos, base=0):
                 #value = 'LONG[%d]@%d' % (count, offset)
             elif ftype == 5: # RATIONAL
                 offset = self.u4()
-                self.stream.seek(base + offset)
+                self.seek(base + offset)
                 num = self.u4()
                 den = self.u4()
                 value = '%d/%d' % (num, den)
@@ -372,12 +359,12 @@ def decode_ifd(self, ifdpos, base=0):
                     offset = self.u4('_offset')
                     self.seek(base + offset)
                 try:
-                    value = self.read(count)
+                    value = bytes(self.read(count))
                 except EOFError:
                     value = None
             elif ftype == 10: # SRATIONAL
                 offset = self.u4()
-                self.stream.seek(base + offset)
+                self.seek(base + offset)
                 num = self.i4()
                 den = self.i4()
                 value = '%d/%d' % (num, den)
@@ -398,12 +385,13 @@ def decode_ifd(self, ifdpos, base=0):
                 self.vset(tagname, value)
 
 class TIFFDecoder(Decoder):
-    def __init__(self, stream, view):
-        ee = stream.read(2)
+    def __init__(self, data, view):
+        super(TIFFDecoder,self).__init__(data, view)
+        ee = self.read(2)
         if ee == b'II':
-            super(TIFFDecoder,self).__init__(stream, view, big_endian=False)
+            self._set_endian(False)
         elif ee == b'MM':
-            super(TIFFDecoder,self).__init__(stream, view, big_endian=True)
+            self._set_endian(True)
         else:
             raise ValueError('Invalid TIFF header: expected II or MM')
         vv = self.u2()
@@ -412,13 +400,14 @@ class TIFFDecoder(Decoder):
 
     def run(self):
         ifdpos = self.u4('_ifdpos')
-        self.vset('_at', self.stream.tell())
+        self.vset('_at', self.pos)
         # Must be >= 8, i.e. what we've read so far
         decode_ifd(self, ifdpos)
 
 def main():
     from .viewer import PlainViewer
     import argparse
+    import mmap
     ap = argparse.ArgumentParser()
     ap.add_argument('-e','--ecd','--entropy-coded-data', action='store_true',
                     help='Dump entropy-coded data')
@@ -427,8 +416,12 @@ def main():
     args = ap.parse_args()
     view = PlainViewer()
     with open(args.jpgfile,'rb') as f:
-        dec = JpgDecoder(f, view, with_ecd=args.ecd)
-        dec.run()
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        dec = JpgDecoder(mm, view, with_ecd=args.ecd)
+        try:
+            dec.run()
+        finally:
+            view.flush()
 
 if __name__=='__main__':
     main()
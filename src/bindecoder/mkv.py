@@ -6,7 +6,6 @@ Decode Matroska or webm file
 #	https://www.matroska.org/technical/elements.html
 #=======================================================================
 from .decoder import Decoder
-from .hexdumper import HexDumper
 
 C_UNKNOWN, C_ELEMENTS, C_UINT, C_FLOAT, C_STRING, C_UTF8 = range(6)
 
@@ -139,13 +138,13 @@ class EBMLDecoder(Decoder):
         elif ctype == C_FLOAT:
             self.val_float(name, size)
         elif ctype == C_STRING:
-            value = self.read(size).decode('ascii')
+            value = bytes(self.read(size)).decode('ascii')
             self.vset(name, value)
         elif ctype == C_UTF8:
-            value = self.read(size).decode('utf8')
+            value = bytes(self.read(size)).decode('utf8')
             self.vset(name, value)
         else:
-            self.view.blob(name, self.read(size))
+            self.view.blob(name, bytes(self.read(size)))
 
     def val_float(self, name, size):
         if size == 0:
@@ -196,21 +195,18 @@ class EBMLDecoder(Decoder):
         #self.vset('_VINT_hex', hex(value))
         return value
 
-    # Output methods
-    def hexdump(self, data, limit=256):
-        for line in HexDumper(data[:limit]).iter_lines():
-            offset, _, dump = line.partition(': ')
-            self.vset(offset[1:].replace(' ','0'), dump)
-        if len(data) > limit:
-            self.vset('dump_size', len(data))
-
 def main():
     from .viewer import PlainViewer
+    import mmap
     import sys
     view = PlainViewer()
     with open(sys.argv[1],'rb') as f:
-        dec = EBMLDecoder(f, view)
-        dec.run()
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        dec = EBMLDecoder(mm, view)
+        try:
+            dec.run()
+        finally:
+            view.flush()
 
 if __name__=='__main__':
     main()
@@ -9,39 +9,216 @@ Decode Quicktime (.mov) file
 #	https://developer.apple.com/library/archive/documentation/QuickTime/QTFF/QTFFPreface/qtffPreface.html
 #=======================================================================
 from .decoder import Decoder
-from .hexdumper import HexDumper
+from concurrent.futures import ThreadPoolExecutor
+import struct
+
+try:
+    import numpy as np
+except ImportError:     # Optional; sample tables fall back to plain loops
+    np = None
+
+try:
+    from ._numba_kernels import decode_be_u32
+except ImportError:     # numba (or numpy) not available
+    decode_be_u32 = None
+
+# Field kinds for the declarative atom layouts below:
+# struct code and expression applied to each unpacked value
+_scalar_kinds = {
+    'u1': ('B', '%s'),
+    'u2': ('H', '%s'),
+    'u4': ('I', '%s'),
+    'i2': ('h', '%s'),
+    'i4': ('i', '%s'),
+    's4': ('4s', "%s.decode('iso-8859-1')"),
+    'v4': ('I', '%s * self._inv16'),
+    'fix16': ('i', '%s * self._inv16'),
+}
+
+# Layouts of the fixed-format atoms as (name, kind) pairs; 'vflags' is
+# the version/flags longword, 'Nx' skips reserved bytes, 'matrix' and
+# 'dump' call the corresponding methods.  Compiled into do_* methods
+# by _compile_atom_method.
+_atom_specs = {
+    'tkhd': [('version_flags', 'vflags'),
+             ('creation_time', 'u4'),
+             ('modification_time', 'u4'),
+             ('track_id', 'u4'),
+             (None, '4x'),
+             ('duration', 'u4'),
+             (None, '8x'),
+             ('layer', 'u2'),
+             ('alternate_group', 'u2'),
+             ('volume', 'u2'),
+             (None, '2x'),
+             ('matrix', 'matrix'),
+             ('track_width', 'v4'),
+             ('track_height', 'v4'),
+             (None, 'dump')],
+    'mdhd': [('version_flags', 'vflags'),
+             ('creation_time', 'u4'),
+             ('modification_time', 'u4'),
+             ('timescale', 'u4'),
+             ('duration', 'u4'),
+             ('language', 'u2'),
+             ('quality', 'u2'),
+             (None, 'dump')],
+    'mvhd': [('version_flags', 'vflags'),
+             ('creation_time', 'u4'),
+             ('modification_time', 'u4'),
+             ('timescale', 'u4'),
+             ('duration', 'u4'),
+             ('preferred_rate', 'fix16'),
+             ('preferred_volume', 'u2'), # FIXME fixed 16
+             (None, '10x'),
+             ('matrix', 'matrix'),
+             ('preview_time', 'u4'),
+             ('poster_time', 'u4'),
+             ('poster_duration', 'u4'),
+             ('selection_time', 'u4'),
+             ('selection_duration', 'u4'),
+             ('current_time', 'u4'),
+             ('next_track_id', 'u4')],
+    'hdlr': [('version_flags', 'vflags'),
+             ('component_type', 's4'),
+             ('component_subtype', 's4'),
+             (None, '12x'),      # Reserved (manuf, flags, flagsmask)
+             (None, 'dump')],
+}
+
+def _compile_atom_method(atype, spec):
+    """Generate a do_* method from a declarative field layout
+
+    Runs of fixed-size fields are unpacked with a single precompiled
+    Struct, so the generated method has no per-field read or method
+    dispatch; 'matrix' and 'dump' fields break the run.
+    """
+    ns = {}
+    body = []
+    fmt = ['>']
+    group = []                  # (varname, emit lines) for this struct
+
+    def flush():
+        if len(fmt) == 1:
+            return
+        st = struct.Struct(''.join(fmt))
+        sname = '_s%d' % len(ns)
+        ns[sname] = st
+        if group:
+            targets = ', '.join(var for var, emits in group)
+            if len(group) == 1:
+                targets += ','
+            body.append('    %s = %s.unpack(self.read(%d))' %
+                        (targets, sname, st.size))
+        else:
+            body.append('    %s.unpack(self.read(%d))' % (sname, st.size))
+        for var, emits in group:
+            body.extend(emits)
+        del fmt[1:]
+        del group[:]
+
+    for name, kind in spec:
+        if kind == 'vflags':
+            fmt.append('I')
+            group.append(('vf', ["    self.vset('version', vf >> 24)",
+                                 "    self.vset('flags', vf & 0xffffff)"]))
+        elif kind in _scalar_kinds:
+            code, expr = _scalar_kinds[kind]
+            fmt.append(code)
+            group.append((name, ["    self.vset('%s', %s)" %
+                                 (name, expr % name)]))
+        elif kind.endswith('x') and kind[:-1].isdigit():
+            fmt.append(kind)
+        elif kind == 'matrix':
+            flush()
+            body.append("    self.matrix('%s')" % name)
+        elif kind == 'dump':
+            flush()
+            body.append('    self.hexdump(self.read())')
+        else:
+            raise ValueError('Unknown field kind %r' % kind)
+    flush()
+    source = 'def do_%s(self):\n%s\n' % (atype, '\n'.join(body))
+    exec(compile(source, '<atom %s>' % atype, 'exec'), ns)
+    return ns['do_%s' % atype]
 
 class QtDecoder(Decoder):
-    def __init__(self, file, view):
+    # Pre-built Structs for the fixed-layout headers ('x' = reserved)
+    _atom_hdr = struct.Struct('>I4s')
+    _matrix = struct.Struct('>9i')
+
+    def __init__(self, file, view, parallel=False):
         super(QtDecoder,self).__init__(file, view, big_endian=True)
+        # Decode sibling atoms in worker threads
+        self.parallel = parallel
 
     def run(self):
         self.atoms()
 
     def atoms(self):
+        if self.parallel:
+            self.atoms_parallel()
+            return
         while self.atom():
             pass
 
+    def atoms_parallel(self):
+        """Decode the sibling atoms at this level in worker threads
+
+        Siblings (e.g. multiple trak under moov) are independent, so
+        each is decoded into its own RecordingViewer over its own slice
+        of the buffer, then replayed into the real viewer in file order.
+        """
+        children = []
+        while True:
+            try:
+                size, atype4 = self._atom_hdr.unpack(self.read(8))
+            except EOFError:
+                break
+            if size < 8:        # Terminator, or corrupt
+                break
+            children.append((atype4.decode('iso-8859-1'), size,
+                             self.read(size - 8)))
+        with ThreadPoolExecutor() as ex:
+            results = ex.map(self._decode_child, children)
+        for rec in results:
+            rec.replay(self.view)
+
+    def _decode_child(self, child):
+        from .viewer import RecordingViewer
+        atype, size, body = child
+        view = RecordingViewer()
+        sub = QtDecoder(body, view, parallel=self.parallel)
+        sub.atom_body(atype, size)
+        return view
+
     def atom(self):
         try:
-            size = self.u4()
+            size, atype4 = self._atom_hdr.unpack(self.read(8))
         except EOFError:
             return False
         if size == 0:
             return False
-        atype = self.s4()
+        atype = atype4.decode('iso-8859-1')
         with self.substream(size - 8):
-
-            with self.view.map("'%s'" % atype):
-                self.vset('_size', size)
-                method = getattr(self, 'do_'+atype, None)
-                if method:
-                    method()
-                rest = self.read()
-                if rest:
-                    self.hexdump(rest)
+            self.atom_body(atype, size)
         return True
 
+    def atom_body(self, atype, size):
+        # Enter/exit the viewer directly, avoiding a contextmanager
+        # object per atom
+        self.view.enter_map("'%s'" % atype)
+        try:
+            self.vset('_size', size)
+            method = getattr(self, 'do_'+atype, None)
+            if method:
+                method()
+            rest = self.read()
+            if rest:
+                self.hexdump(rest)
+        finally:
+            self.view.exit()
+
     #    self.decode
     do_moov = atoms
     do_trak = atoms
@@ -72,69 +249,8 @@ class QtDecoder(Decoder):
                     self.vset(i, comp)
                 i += 1
 
-    def do_tkhd(self):
-        vf = self.u4()
-        self.vset('version', vf >> 24)
-        self.vset('flags', vf & 0xffffff)
-        self.vset('creation_time', self.u4())
-        self.vset('modification_time', self.u4())
-        self.vset('track_id', self.u4())
-        self.read(4)               # Reserved
-        self.vset('duration', self.u4())
-        self.read(8)               # Reserved
-        self.vset('layer', self.u2())
-        self.vset('alternate_group', self.u2())
-        self.vset('volume', self.u2())
-        self.read(2)               # Reserved
-        #m = [s.v4() for i in range(9)]
-        #self.put('matrix = ( %8g %8g %8g )' % (m[0], m[1], m[2]/16384))
-        #self.put('         ( %8g %8g %8g )' % (m[3], m[4], m[5]/16384))
-        #self.put('         ( %8g %8g %8g )' % (m[6], m[7], m[8]/16384))
-        self.matrix('matrix')
-        self.vset('track_width', self.v4())
-        self.vset('track_height', self.v4())
-        self.hexdump(self.read())
-
-    def do_hdlr(self):
-        vf = self.u4()
-        self.vset('version', vf >> 24)
-        self.vset('flags', vf & 0xffffff)
-        self.vset('component_type', self.s4())
-        self.vset('component_subtype', self.s4())
-        self.read(12)              # Reserved (manuf, flags, flagsmask)
-        self.hexdump(self.read())
-
-    def do_mdhd(self):
-        vf = self.u4()
-        self.vset('version', vf >> 24)
-        self.vset('flags', vf & 0xffffff)
-        self.vset('creation_time', self.u4())
-        self.vset('modification_time', self.u4())
-        self.vset('timescale', self.u4())
-        self.vset('duration', self.u4())
-        self.vset('language', self.u2())
-        self.vset('quality', self.u2())
-        self.hexdump(self.read())
-
-    def do_mvhd(self):
-        vf = self.u4()
-        self.vset('version', vf >> 24)
-        self.vset('flags', vf & 0xffffff)
-        self.vset('creation_time', self.u4())
-        self.vset('modification_time', self.u4())
-        self.vset('timescale', self.u4())
-        self.vset('duration', self.u4())
-        self.vset('preferred_rate', self.fix32())
-        self.vset('preferred_volume', self.u2()) # FIXME fixed 16
-        self.read(10)
-        self.matrix('matrix')
-        self.vset('preview_time', self.u4())
-        self.vset('poster_time', self.u4())
-        self.vset('poster_duration', self.u4())
-        self.vset('selection_time', self.u4())
-        self.vset('selection_duration', self.u4())
-        self.vset('current_time', self.u4())
-        self.vset('next_track_id', self.u4())        
+    # do_tkhd, do_mdhd, do_mvhd and do_hdlr are generated from
+    # _atom_specs after the class definition
 
     def do_vmhd(self):
         vf = self.u4()
@@ -151,7 +267,7 @@ class QtDecoder(Decoder):
         nent = self.u4()
         with self.view.array('entries'):
             for i in range(nent):
-                with self.view.array(i):
+                with self.view.map(i):
                     esize = self.u4()
                     self.vset('type', self.s4())
                     evf = self.u4()
@@ -180,18 +296,17 @@ class QtDecoder(Decoder):
         self.vset('version', vf >> 24)
         self.vset('flags', vf & 0xffffff)
         nent = self.u4()
-        for i in range(nent):
-            with self.view.map('entry[%d]' % i):
-                self.vset('sample_count', self.u4())
-                self.vset('sample_duration', self.u4())
+        counts, durations = self.u4_columns(nent, 2)
+        self.view.array_of_ints('sample_count', counts)
+        self.view.array_of_ints('sample_duration', durations)
 
     def do_stss(self):
         vf = self.u4()
         self.vset('version', vf >> 24)
         self.vset('flags', vf & 0xffffff)
         nent = self.u4()
-        for i in range(nent):
-            self.vset('sample[%d]' % i, self.u4())
+        samples, = self.u4_columns(nent, 1)
+        self.view.array_of_ints('samples', samples)
 
     def do_stsc(self):
         """Map sample numbers to chunk numbers"""
@@ -199,11 +314,11 @@ class QtDecoder(Decoder):
         self.vset('version', vf >> 24)
         self.vset('flags', vf & 0xffffff)
         nent = self.u4()
-        for i in range(nent):
-            self.vset('sample[%d].first' % i, self.u4())
-            self.vset('sample[%d].samples' % i, self.u4())
-            self.vset('sample[%d].descID' % i, self.u4())
-        
+        firsts, samples, descids = self.u4_columns(nent, 3)
+        self.view.array_of_ints('first', firsts)
+        self.view.array_of_ints('samples', samples)
+        self.view.array_of_ints('descID', descids)
+
     def do_stsz(self):
         vf = self.u4()
         self.vset('version', vf >> 24)
@@ -213,8 +328,8 @@ class QtDecoder(Decoder):
         if sampsize == 0:       # Use table
             nent = self.u4()
             self.vset('nent', nent)
-            for i in range(nent):
-                self.vset('size[%d]' % i, self.u4())
+            sizes, = self.u4_columns(nent, 1)
+            self.view.array_of_ints('sizes', sizes)
         else:
             # Junk?
             self.hexdump(self.read())
@@ -224,46 +339,79 @@ class QtDecoder(Decoder):
         self.vset('version', vf >> 24)
         self.vset('flags', vf & 0xffffff)
         nent = self.u4()
-        for i in range(nent):
-            self.vset('offset[%d]' % i, self.u4())
+        offsets, = self.u4_columns(nent, 1)
+        self.view.array_of_ints('offsets', offsets)
+
+    def u4_columns(self, nent, ncols):
+        """Read nent rows of ncols big-endian u32 values as per-column lists
+
+        With numpy available this is a single C-level read of the whole
+        table rather than a Python call per value.
+        """
+        nval = nent * ncols
+        if decode_be_u32 is not None:
+            arr = decode_be_u32(np.frombuffer(self.read(4 * nval), np.uint8))
+            return [arr[i::ncols].tolist() for i in range(ncols)]
+        if np is not None:
+            arr = np.frombuffer(self.read(4 * nval), '>u4')
+            return [arr[i::ncols].tolist() for i in range(ncols)]
+        vals = [self.u4() for i in range(nval)]
+        return [vals[i::ncols] for i in range(ncols)]
 
     def matrix(self, name):
+        # One unpack for the whole 3x3 matrix of 16.16 / 2.30 fixed-point
+        vals = self._matrix.unpack(self.read(36))
         for row in range(3):
-            v0, v1, v2 = self.fix32(16), self.fix32(16), self.fix32(30)
+            a, b, w = vals[3*row:3*row+3]
             self.vset('%s_%d' % (name, row),
-                      '( %8g %8g %8g )' % (v0, v1, v2))
-
-    # Output methods
-    def hexdump(self, data, limit=256):
-        for line in HexDumper(data[:limit]).iter_lines():
-            offset, _, dump = line.partition(': ')
-            self.vset(offset[1:].replace(' ','0'), dump)
-        if len(data) > limit:
-            self.vset('dump_size', len(data))
+                      '( %8g %8g %8g )' %
+                      (a * self._inv16, b * self._inv16, w * self._inv30))
 
     # Qt-specific low-level items
     def s4(self):
         """Read a 4-byte string (fourcc)"""
-        b4 = self.read(4)
+        b4 = bytes(self.read(4))
         return b4.decode('iso-8859-1')
 
+    # Reciprocals of the common fixed-point scales; multiplying is
+    # cheaper than dividing
+    _inv16 = 1.0 / 65536.0
+    _inv30 = 1.0 / 1073741824.0
+
     def v4(self):
         """Read unsigned fixed-point 16.16 bit value"""
-        val = self.u4()
-        return val / 65536.
+        return self.u4() * self._inv16
 
     def fix32(self, fracbits=16):
         """Read a fixed-point real"""
         val = self.i4()
+        if fracbits == 16:
+            return val * self._inv16
+        if fracbits == 30:
+            return val * self._inv30
         return float(val) / (1 << fracbits)
 
+# Compile the declarative layouts into methods
+for _atype, _spec in _atom_specs.items():
+    setattr(QtDecoder, 'do_' + _atype, _compile_atom_method(_atype, _spec))
+
 def main():
     from .viewer import PlainViewer
-    import sys
+    import argparse
+    import mmap
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--parallel', action='store_true',
+                    help='Decode sibling atoms in worker threads')
+    ap.add_argument('movfile')
+    args = ap.parse_args()
     view = PlainViewer()
-    with open(sys.argv[1],'rb') as f:
-        dec = QtDecoder(f, view)
-        dec.run()
+    with open(args.movfile,'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        dec = QtDecoder(mm, view, parallel=args.parallel)
+        try:
+            dec.run()
+        finally:
+            view.flush()
 
 if __name__=='__main__':
     main()
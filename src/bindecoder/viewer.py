@@ -4,6 +4,7 @@ Back ends for bindecoder
 """
 #=======================================================================
 from contextlib import contextmanager
+import sys
 
 class Viewer:
     """Base class for bindecoder back ends"""
@@ -36,10 +37,60 @@ class Viewer:
         """Typically unparsed data, or wrapped encoded data"""
         raise NotImplementedError
 
+    def flush(self):
+        """Emit any pending output; back ends which buffer override this"""
+        pass
+
+    def array_of_ints(self, name, values):
+        """A homogeneous array of integers, emitted in one call
+
+        Back ends may override this to avoid per-element overhead.
+        """
+        with self.array(name):
+            for i, value in enumerate(values):
+                self.set(i, value)
+
+class RecordingViewer(Viewer):
+    """Record viewer calls for later replay into another back end
+
+    Order-preserving and indifferent to repeated names, unlike
+    DataViewer, so suitable for stitching together independently
+    decoded subtrees.
+    """
+    def __init__(self):
+        self.events = []
+
+    def enter_map(self, name):
+        self.events.append(('enter_map', name))
+
+    def enter_array(self, name):
+        self.events.append(('enter_array', name))
+
+    def exit(self):
+        self.events.append(('exit',))
+
+    def set(self, name, value):
+        self.events.append(('set', name, value))
+
+    def blob(self, name, data):
+        # Copy: the data may be a view of a buffer still being consumed
+        self.events.append(('blob', name, bytes(data)))
+
+    def array_of_ints(self, name, values):
+        self.events.append(('array_of_ints', name, values))
+
+    def replay(self, view):
+        """Apply the recorded calls to another viewer"""
+        for event in self.events:
+            getattr(view, event[0])(*event[1:])
+
 class PlainViewer(Viewer):
     """Print structure, indented"""
     def __init__(self):
         self.level = 0
+        self._indents = ['']
+        self._buf = []
+        self._buf_size = 0
 
     def set(self, name, value):
         self.show('%s = %r' % (name, value))
@@ -50,12 +101,32 @@ class PlainViewer(Viewer):
             hdata += '...'
         self.show('%s[%d]: %s' % (name, len(data), hdata))
 
+    def array_of_ints(self, name, values):
+        preview = ' '.join(str(v) for v in values[:16])
+        if len(values) > 16:
+            preview += '...'
+        self.show('%s[%d]: %s' % (name, len(values), preview))
+
     def show(self, text):
-        print('%s%s' % ('  ' * self.level, text))
+        # Buffer lines rather than locking and flushing stdout per line
+        line = '%s%s\n' % (self._indents[self.level], text)
+        self._buf.append(line)
+        self._buf_size += len(line)
+        if self._buf_size > 65536:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            sys.stdout.write(''.join(self._buf))
+            self._buf = []
+            self._buf_size = 0
 
     def enter(self, name):
         self.show('%s:' % name)
         self.level += 1
+        # Cached indent prefix per level
+        while len(self._indents) <= self.level:
+            self._indents.append('  ' * len(self._indents))
 
     enter_map = enter
     enter_array = enter
@@ -101,6 +172,9 @@ class DataViewer(Viewer):
 
     blob = set
 
+    def array_of_ints(self, name, values):
+        self.set(name, list(values))
+
     def result(self):
         """Get the built data structure"""
         return self.cur